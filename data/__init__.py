@@ -21,7 +21,6 @@ from .gps import WatchGPSData
 from .data import FullSensorData
 from .config import VizConfig
 from .annotate import SingleDataWindow
-import copy
 import datetime
 import os
 
@@ -33,14 +32,20 @@ VALID_MODES = list([MODE_GPS, MODE_SENSORS])
 class WatchData:
     def __init__(self):
         self.mode = MODE_SENSORS
+        self.mode_is_gps = False
         self.has_any_data = False
         self.gps_data = WatchGPSData()
         self.full_data = FullSensorData()
+        self.mode_data = dict({MODE_GPS: self.gps_data,
+                               MODE_SENSORS: self.full_data})
+        self.active_data = self.mode_data[self.mode]
         return
 
     def set_mode(self, mode: str):
         if mode in VALID_MODES:
             self.mode = mode
+            self.mode_is_gps = mode == MODE_GPS
+            self.active_data = self.mode_data[mode]
         return
 
     def update_config(self, wconfig: VizConfig):
@@ -66,96 +71,48 @@ class WatchData:
         return self.full_data.data_has_changed or self.gps_data.data_has_changed
 
     def index(self) -> int:
-        i = 0
-        if self.mode == MODE_GPS:
-            i = self.gps_data.index
-        elif self.mode == MODE_SENSORS:
-            i = self.full_data.index
-        return i
+        return self.active_data.index
 
     def data_size(self) -> int:
-        i = 20
-        if self.mode == MODE_GPS:
-            i = self.gps_data.data_size - self.gps_data.gps_window
-        elif self.mode == MODE_SENSORS:
-            i = self.full_data.data_size - self.full_data.sensor_window
-        return i
+        return self.active_data.max_index()
 
     def get_first_stamp(self) -> str:
-        msg = '...'
-        if self.mode == MODE_GPS:
-            msg = self.gps_data.get_first_stamp()
-        elif self.mode == MODE_SENSORS:
-            msg = self.full_data.get_first_stamp()
-        return msg
+        return self.active_data.get_first_stamp()
 
     def get_current_stamp(self) -> str:
-        msg = '...'
-        if self.mode == MODE_GPS:
-            msg = self.gps_data.get_current_stamp()
-        elif self.mode == MODE_SENSORS:
-            msg = self.full_data.get_current_stamp()
-        return msg
+        return self.active_data.get_current_stamp()
 
     def get_last_stamp(self) -> str:
-        msg = '...'
-        if self.mode == MODE_GPS:
-            msg = self.gps_data.get_last_stamp()
-        elif self.mode == MODE_SENSORS:
-            msg = self.full_data.get_last_stamp()
-        return msg
+        return self.active_data.get_last_stamp()
 
     def increase_window_size(self) -> bool:
-        action = False
-        if self.mode == MODE_GPS:
-            action = self.gps_data.increase_window_size()
-        elif self.mode == MODE_SENSORS:
-            action = self.full_data.increase_window_size()
-        return action
+        return self.active_data.increase_window_size()
 
     def decrease_window_size(self) -> bool:
-        action = False
-        if self.mode == MODE_GPS:
-            action = self.gps_data.decrease_window_size()
-        elif self.mode == MODE_SENSORS:
-            action = self.full_data.decrease_window_size()
-        return action
+        return self.active_data.decrease_window_size()
 
     def step_forward(self) -> bool:
-        action = False
-        if self.mode == MODE_GPS:
-            action = self.gps_data.step_forward()
-        elif self.mode == MODE_SENSORS:
-            action = self.full_data.step_forward()
-        return action
+        return self.active_data.step_forward()
 
     def step_backward(self) -> bool:
-        action = False
-        if self.mode == MODE_GPS:
-            action = self.gps_data.step_backward()
-        elif self.mode == MODE_SENSORS:
-            action = self.full_data.step_backward()
-        return action
+        return self.active_data.step_backward()
 
     def goto_index(self, clicked_float: float):
-        if self.mode == MODE_GPS:
-            self.gps_data.goto_index(clicked_float=clicked_float)
-        elif self.mode == MODE_SENSORS:
-            self.full_data.goto_index(clicked_float=clicked_float)
+        self.active_data.goto_index(clicked_float=clicked_float)
         return
 
     def mark_window_invalid(self):
-        if self.mode == MODE_GPS:
+        if self.mode_is_gps:
             self.gps_data.mark_window_invalid()
         return
 
     def mark_window_valid(self):
-        if self.mode == MODE_GPS:
+        if self.mode_is_gps:
             self.gps_data.mark_window_valid()
         return
 
     def annotate_window(self, annotation: str):
-        if self.mode == MODE_SENSORS:
+        if not self.mode_is_gps:
             self.full_data.annotate_window(annotation=annotation)
         return
 
@@ -164,7 +121,7 @@ class WatchData:
         return
 
     def remove_window_annotation(self):
-        if self.mode == MODE_SENSORS:
+        if not self.mode_is_gps:
             self.full_data.remove_window_annotation()
         return
 
@@ -173,31 +130,31 @@ class WatchData:
         return
 
     def add_note(self, msg: str):
-        if self.mode == MODE_SENSORS and self.has_sensors_data():
+        if not self.mode_is_gps and self.has_sensors_data():
             self.full_data.add_note(msg=msg)
         return
 
     def get_label_text(self) -> list:
         msg = list([['', '...', '']])
-        if self.mode == MODE_SENSORS and self.has_sensors_data():
+        if not self.mode_is_gps and self.has_sensors_data():
             msg = self.full_data.get_label_text()
         return msg
 
     def get_given_label_text(self, data_window: SingleDataWindow) -> list:
         msg = list([['', '...', '']])
-        if self.mode == MODE_SENSORS and self.has_sensors_data():
+        if not self.mode_is_gps and self.has_sensors_data():
             msg = self.full_data.get_given_label_text(data_window=data_window)
         return msg
 
     def get_note_text(self) -> list:
         msg = list(['', '...'])
-        if self.mode == MODE_SENSORS and self.has_sensors_data():
+        if not self.mode_is_gps and self.has_sensors_data():
             msg = self.full_data.get_note_text()
         return msg
 
     def get_given_note_text(self, data_window: SingleDataWindow) -> list:
         msg = list(['', '...'])
-        if self.mode == MODE_SENSORS and self.has_sensors_data():
+        if not self.mode_is_gps and self.has_sensors_data():
             msg = self.full_data.get_given_note_text(data_window=data_window)
         return msg
 
@@ -221,12 +178,12 @@ class WatchData:
         return
 
     def plot_gps(self, axis):
-        if self.mode == MODE_GPS:
+        if self.mode_is_gps:
             self.gps_data.plot_gps(axis=axis)
         return
 
     def plot_sensors(self, axis1, axis2, axis3, axis4):
-        if self.mode == MODE_SENSORS:
+        if not self.mode_is_gps:
             self.full_data.plot_sensors(axis1=axis1,
                                         axis2=axis2,
                                         axis3=axis3,
@@ -245,6 +202,10 @@ class WatchData:
             done_callback()
         return
 
+    def close(self):
+        self.gps_data.stop_prefetch()
+        return
+
     def save_data(self, filename: str, update_callback=None, done_callback=None):
         self.full_data.merge_data_changes(gps_data=self.gps_data,
                                           update_callback=update_callback)
@@ -16,15 +16,14 @@
 # **
 # ** Contact: Brian L. Thomas (bthomas1@wsu.edu)
 # *****************************************************************************#
-import copy
+from dataclasses import dataclass
 
 
+@dataclass(slots=True, frozen=True)
 class SingleDataWindow:
-    def __init__(self, i_start: int, i_last: int, label: str):
-        self.i_start = i_start
-        self.i_last = i_last
-        self.label = label
-        return
+    i_start: int
+    i_last: int
+    label: str
 
 
 class DataWindowList:
@@ -34,5 +33,6 @@ class DataWindowList:
         return
 
     def add_window(self, window: SingleDataWindow):
-        self.list.append(copy.deepcopy(window))
+        # Windows are frozen, so the list can hold the caller's instance without a copy.
+        self.list.append(window)
         return
@@ -21,6 +21,7 @@ import os
 
 DEFAULT_GPS_VALID = 'g'
 DEFAULT_GPS_INVALID = 'b'
+DEFAULT_WARM_TILE_CACHE = False
 DEFAULT_GPS_WINDOW_SIZE = 10
 DEFAULT_GPS_STEP_DELTA = 1
 DEFAULT_GPS_WIN_SIZE_ADJ = 1
@@ -42,6 +43,7 @@ class VizConfig:
         self.filename = None
         self.gps_valid = DEFAULT_GPS_VALID
         self.gps_invalid = DEFAULT_GPS_INVALID
+        self.warm_tile_cache = DEFAULT_WARM_TILE_CACHE
         self.annotations = dict()
         self.gps_window_size = DEFAULT_GPS_WINDOW_SIZE
         self.gps_step_delta_rate = DEFAULT_GPS_STEP_DELTA
@@ -68,7 +70,7 @@ class VizConfig:
         if filename is not None:
             if os.path.isfile(filename):
                 self.filename = filename
-                self.config.read(self.filename)
+                self.config.read(self.filename, encoding='utf-8')
         # Load the labeling values.
         self.gps_valid = self.config.get(section='gps',
                                          option='valid',
@@ -76,9 +78,12 @@ class VizConfig:
         self.gps_invalid = self.config.get(section='gps',
                                            option='invalid',
                                            fallback=DEFAULT_GPS_INVALID)
+        self.warm_tile_cache = self.config.getboolean(section='gps',
+                                                      option='warm_tile_cache',
+                                                      fallback=DEFAULT_WARM_TILE_CACHE)
         if 'annotations' in self.config.sections():
-            for key in list(self.config['annotations'].keys()):
-                self.annotations[key] = self.config['annotations'][key]
+            for key, value in self.config['annotations'].items():
+                self.annotations[key] = value
         if 'special' in self.config.sections():
             self.remove_annotation_key = self.config.get(section='special',
                                                          option='key_to_remove_annotations',
@@ -89,30 +94,23 @@ class VizConfig:
                                  'one of the annotation keys, please change it to a different '
                                  'value in config.conf and try again.\n')
         # Load the window configs.
-        self.gps_window_size = self.config.getint(section='graphs',
-                                                  option='gps_window_size',
-                                                  fallback=DEFAULT_GPS_WINDOW_SIZE)
-        self.gps_step_delta_rate = self.config.getint(section='graphs',
-                                                      option='gps_step_delta_rate',
-                                                      fallback=DEFAULT_GPS_STEP_DELTA)
-        self.gps_win_size_adj_rate = self.config.getint(section='graphs',
-                                                        option='gps_win_size_adj_rate',
-                                                        fallback=DEFAULT_GPS_WIN_SIZE_ADJ)
-        self.sensors_window_size = self.config.getint(section='graphs',
-                                                      option='sensors_window_size',
-                                                      fallback=DEFAULT_SEN_WINDOW_SIZE)
-        self.sensors_step_delta_rate = self.config.getint(section='graphs',
-                                                          option='sensors_step_delta_rate',
-                                                          fallback=DEFAULT_SEN_STEP_DELTA)
-        self.sensors_win_size_adj_rate = self.config.getint(section='graphs',
-                                                            option='sensors_win_size_adj_rate',
-                                                            fallback=DEFAULT_SEN_WIN_SIZE_ADJ)
-        self.label_search_minutes = self.config.getint(section='graphs',
-                                                       option='label_search_minutes',
-                                                       fallback=DEFAULT_LABEL_SEARCH_MINUTES)
-        self.notes_search_minutes = self.config.getint(section='graphs',
-                                                       option='notes_search_minutes',
-                                                       fallback=DEFAULT_NOTES_SEARCH_MINUTES)
+        graphs = self.config['graphs']
+        self.gps_window_size = graphs.getint('gps_window_size',
+                                             fallback=DEFAULT_GPS_WINDOW_SIZE)
+        self.gps_step_delta_rate = graphs.getint('gps_step_delta_rate',
+                                                 fallback=DEFAULT_GPS_STEP_DELTA)
+        self.gps_win_size_adj_rate = graphs.getint('gps_win_size_adj_rate',
+                                                   fallback=DEFAULT_GPS_WIN_SIZE_ADJ)
+        self.sensors_window_size = graphs.getint('sensors_window_size',
+                                                 fallback=DEFAULT_SEN_WINDOW_SIZE)
+        self.sensors_step_delta_rate = graphs.getint('sensors_step_delta_rate',
+                                                     fallback=DEFAULT_SEN_STEP_DELTA)
+        self.sensors_win_size_adj_rate = graphs.getint('sensors_win_size_adj_rate',
+                                                       fallback=DEFAULT_SEN_WIN_SIZE_ADJ)
+        self.label_search_minutes = graphs.getint('label_search_minutes',
+                                                  fallback=DEFAULT_LABEL_SEARCH_MINUTES)
+        self.notes_search_minutes = graphs.getint('notes_search_minutes',
+                                                  fallback=DEFAULT_NOTES_SEARCH_MINUTES)
         return
 
     def save_config(self, filename: str = None):
@@ -144,12 +142,16 @@ class VizConfig:
         # Set the labeling values.
         self.config.set(section='gps', option='valid', value=self.gps_valid)
         self.config.set(section='gps', option='invalid', value=self.gps_invalid)
-        for key in list(self.annotations.keys()):
-            self.config.set(section='annotations', option=key, value=self.annotations[key])
+        self.config.set(section='gps', option='warm_tile_cache', value=str(self.warm_tile_cache))
+        for key, value in self.annotations.items():
+            self.config.set(section='annotations', option=key, value=value)
         if filename is not None:
             self.filename = filename
-        configfile = open(self.filename, 'w')
-        self.config.write(configfile)
-        configfile.close()
+        # Write to a temporary file and swap it in, so an interrupted save never leaves a
+        # truncated config behind.
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as configfile:
+            self.config.write(configfile)
+        os.replace(tmp_filename, self.filename)
         return
 
@@ -18,11 +18,12 @@
 # *****************************************************************************#
 from .mobile_al_data import MobileData
 from .gps import WatchGPSData
-from .gps import GPSData
 from .config import VizConfig
 from .annotate import SingleDataWindow
-import copy
+from .windowed import WindowedData
 import datetime
+import functools
+import sys
 import time
 import numpy as np
 from collections import OrderedDict
@@ -41,9 +42,14 @@ BATTERY_FIELD = 'battery_state'
 BATTERY_CHARGING = 'charging'
 DEFAULT_LABEL_SEARCH_DELTA = 60
 DEFAULT_NOTES_SEARCH_DELTA = 60
+LABEL_SCAN_BLOCK = 512
+LINE_COUNT_CHUNK = 1 << 20
+SAVE_CHUNK_ROWS = 4096
+LOAD_CHUNK_ROWS = 50000
+PROGRESS_UPDATE_SECONDS = 0.2
 
 
-class FullSensorData:
+class FullSensorData(WindowedData):
     def __init__(self):
         """
         stamp,yaw,pitch,roll,rotation_rate_x,rotation_rate_y,rotation_rate_z,user_acceleration_x,
@@ -54,26 +60,36 @@ class FullSensorData:
         Errands, Exercise, Hobby, Housework, Hygiene, Mealtime, Other, Relax, Sleep,
         Socialize, Travel, Work
         """
-        self.has_data = False
-        self.data_has_changed = False
-        self.index = 0
-        self.data_size = 0
-        self.sensor_data = list()
-        self.sensor_window = DEFAULT_SENSOR_WINDOW
+        super().__init__(window=DEFAULT_SENSOR_WINDOW, window_size_adj_rate=10,
+                         step_delta_rate=10)
+        # One numpy array per field, float64 for the 'f' fields and object for the rest, so a
+        # window is a slice and labelling it is a single slice assignment.
+        self.columns = dict()
+        # Shortcuts to the columns the label, note and plot code read the most.
+        self.stamps = np.empty(0, dtype=object)
+        self.stamp_times = np.empty(0, dtype='datetime64[us]')
+        self.labels = np.empty(0, dtype=object)
+        self.user_labels = np.empty(0, dtype=object)
+        self.notes = np.empty(0, dtype=object)
         self.fields = None
-        self.window_size_adj_rate = 10
-        self.step_delta_rate = 10
         self.ann_set = set()
         self.ann_list = list()
         self.ann_y = dict()
         self.ann_colors = dict()
+        # The colour of each entry in ann_list, so a label's position in the list picks its colour.
+        self.ann_color_array = np.empty(0, dtype=object)
+        # Set when a new label joins ann_set, ann_list is rebuilt the next time it is plotted.
+        self.ann_list_dirty = False
+        # The sensor trace lines by axis and field, kept between draws so a step only moves
+        # their data.
+        self.trace_lines = dict()
         self.color_map = list()
         self.label_search_delta = datetime.timedelta(minutes=DEFAULT_LABEL_SEARCH_DELTA)
         self.notes_search_delta = datetime.timedelta(minutes=DEFAULT_NOTES_SEARCH_DELTA)
         return
 
     def update_config(self, wconfig: VizConfig):
-        self.sensor_window = wconfig.sensors_window_size
+        self.window = wconfig.sensors_window_size
         self.window_size_adj_rate = wconfig.sensors_win_size_adj_rate
         self.step_delta_rate = wconfig.sensors_step_delta_rate
         self.label_search_delta = datetime.timedelta(minutes=wconfig.label_search_minutes)
@@ -86,107 +102,70 @@ class FullSensorData:
         self.set_config_obj(wconfig=wconfig)
         return
 
-    def apply_window_variable_logic(self):
-        if self.has_data:
-            if self.data_size < self.sensor_window:
-                self.sensor_window = self.data_size
-            if self.data_size < self.window_size_adj_rate:
-                self.window_size_adj_rate = int(self.data_size / 2)
-            if self.data_size < self.step_delta_rate:
-                self.step_delta_rate = int(self.data_size / 2)
-        return
-
     def set_config_obj(self, wconfig: VizConfig):
-        wconfig.sensors_window_size = self.sensor_window
+        wconfig.sensors_window_size = self.window
         wconfig.sensors_win_size_adj_rate = self.window_size_adj_rate
         wconfig.sensors_step_delta_rate = self.step_delta_rate
         return
 
+    @property
+    def sensor_window(self) -> int:
+        return self.window
+
+    @sensor_window.setter
+    def sensor_window(self, value: int):
+        self.window = value
+        return
+
     def get_first_stamp(self) -> str:
         msg = '...'
         if self.has_data:
-            msg = str(self.sensor_data[self.sensor_window - 1]['stamp'])
+            msg = str(self.stamps[self.window - 1])
         return msg
 
     def get_current_stamp(self) -> str:
         msg = '...'
         if self.has_data:
-            msg = str(self.sensor_data[self.index + self.sensor_window - 1]['stamp'])
+            msg = str(self.stamps[self.index + self.window - 1])
         return msg
 
     def get_last_stamp(self) -> str:
         msg = '...'
         if self.has_data:
-            msg = str(self.sensor_data[-1]['stamp'])
+            msg = str(self.stamps[-1])
         return msg
 
-    def increase_window_size(self) -> bool:
-        action = False
-        if (self.index + self.sensor_window + self.window_size_adj_rate) <= self.data_size:
-            self.sensor_window += self.window_size_adj_rate
-            action = True
-        return action
-
-    def decrease_window_size(self) -> bool:
-        action = False
-        if (self.sensor_window - self.window_size_adj_rate) >= 1:
-            self.sensor_window -= self.window_size_adj_rate
-            action = True
-        return action
-
-    def step_forward(self) -> bool:
-        action = False
-        if (self.index + self.sensor_window + self.step_delta_rate) <= self.data_size:
-            self.index += self.step_delta_rate
-            action = True
-        return action
-
-    def step_backward(self) -> bool:
-        action = False
-        if (self.index - self.step_delta_rate) >= 0:
-            self.index -= self.step_delta_rate
-            action = True
-        return action
-
-    def goto_index(self, clicked_float: float):
-        if 0.0 <= clicked_float <= 1.0:
-            self.index = int(clicked_float * (self.data_size - self.sensor_window))
-        return
-
     def annotate_window(self, annotation: str):
         self.data_has_changed = True
-        for i in range(self.index, self.index + self.sensor_window):
-            self.sensor_data[i][LABEL_FIELD] = annotation
-        self.ann_set.add(annotation)
-        self.update_ann_list()
+        self.labels[self.index:self.index + self.window] = annotation
+        if annotation not in self.ann_set:
+            self.ann_set.add(annotation)
+            self.ann_list_dirty = True
         return
 
     def annotate_given_window(self, data_window: SingleDataWindow):
         self.data_has_changed = True
-        for i in range(data_window.i_start, data_window.i_last + 1):
-            self.sensor_data[i][LABEL_FIELD] = data_window.label
-        self.ann_set.add(data_window.label)
-        self.update_ann_list()
+        self.labels[data_window.i_start:data_window.i_last + 1] = data_window.label
+        if data_window.label not in self.ann_set:
+            self.ann_set.add(data_window.label)
+            self.ann_list_dirty = True
         return
 
     def remove_window_annotation(self):
         self.data_has_changed = True
-        for i in range(self.index, self.index + self.sensor_window):
-            self.sensor_data[i][LABEL_FIELD] = None
+        self.labels[self.index:self.index + self.window] = None
         return
 
     def remove_given_window_annotation(self, data_window: SingleDataWindow):
         self.data_has_changed = True
-        for i in range(data_window.i_start, data_window.i_last + 1):
-            self.sensor_data[i][LABEL_FIELD] = None
+        self.labels[data_window.i_start:data_window.i_last + 1] = None
         return
 
     def add_note(self, msg: str):
         self.data_has_changed = True
         if msg == '':
             msg = None
-        for i in range(self.index, self.index + self.sensor_window):
-            self.sensor_data[i][NOTE_FIELD] = msg
+        self.notes[self.index:self.index + self.window] = msg
         return
 
     @staticmethod
@@ -200,153 +179,116 @@ class FullSensorData:
 
     def get_label_text(self) -> list:
         labels = list()
-        i = self.index + self.sensor_window - 1
-        label = self.build_string_line(stamp=self.sensor_data[i]['stamp'],
-                                       label=self.sensor_data[i][LABEL_FIELD],
-                                       user_label=self.sensor_data[i][USER_FIELD])
+        i = self.index + self.window - 1
+        label = self.build_string_line(stamp=self.stamps[i],
+                                       label=self.labels[i],
+                                       user_label=self.user_labels[i])
         label[0] = '> ' + label[0]
         labels.append(label)
         labels.append(list(['', '', '']))
-        current_label = str(self.sensor_data[i][LABEL_FIELD])
-        current_user = str(self.sensor_data[i][USER_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i > 0 and len(labels) < 10 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.label_search_delta:
-            if str(self.sensor_data[i][LABEL_FIELD]) != current_label \
-                    or str(self.sensor_data[i][USER_FIELD]) != current_user:
-                skip_label = False
-                # If the current labels are None and the last annotation label was None,
-                # then go ahead and skip adding this line (the last line was an isolated
-                # user label instance).
-                if self.sensor_data[i][LABEL_FIELD] is None \
-                        and self.sensor_data[i][USER_FIELD] is None \
-                        and current_label == str(None):
-                    skip_label = True
-                if not skip_label:
-                    labels.append(self.build_string_line(
-                        stamp=self.sensor_data[i]['stamp'],
-                        label=self.sensor_data[i][LABEL_FIELD],
-                        user_label=self.sensor_data[i][USER_FIELD]))
-                current_label = str(self.sensor_data[i][LABEL_FIELD])
-                current_user = str(self.sensor_data[i][USER_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                labels.append(list(['', '...', '']))
-            i -= 1
-
-        i = self.index + self.sensor_window - 1
+        self.append_label_changes(labels=labels, i=i, step=-1, max_len=10)
+
         labels.reverse()
         labels.append(list(['', '', '']))
-        current_label = str(self.sensor_data[i][LABEL_FIELD])
-        current_user = str(self.sensor_data[i][USER_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i < self.data_size and len(labels) < 20 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.label_search_delta:
-            if str(self.sensor_data[i][LABEL_FIELD]) != current_label \
-                    or str(self.sensor_data[i][USER_FIELD]) != current_user:
-                skip_label = False
-                # If the current labels are None and the last annotation label was None,
-                # then go ahead and skip adding this line (the last line was an isolated
-                # user label instance).
-                if self.sensor_data[i][LABEL_FIELD] is None \
-                        and self.sensor_data[i][USER_FIELD] is None \
-                        and current_label == str(None):
-                    skip_label = True
-                if not skip_label:
-                    labels.append(self.build_string_line(
-                        stamp=self.sensor_data[i]['stamp'],
-                        label=self.sensor_data[i][LABEL_FIELD],
-                        user_label=self.sensor_data[i][USER_FIELD]))
-                current_label = str(self.sensor_data[i][LABEL_FIELD])
-                current_user = str(self.sensor_data[i][USER_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                labels.append(list(['', '...', '']))
-            i += 1
+        self.append_label_changes(labels=labels, i=i, step=1, max_len=20)
 
         return labels
 
     def get_given_label_text(self, data_window: SingleDataWindow) -> list:
         labels = list()
         i = data_window.i_start
-        label = self.build_string_line(stamp=self.sensor_data[i]['stamp'],
-                                       label=self.sensor_data[i][LABEL_FIELD],
-                                       user_label=self.sensor_data[i][USER_FIELD])
+        label = self.build_string_line(stamp=self.stamps[i],
+                                       label=self.labels[i],
+                                       user_label=self.user_labels[i])
         label[0] = '> ' + label[0]
         labels.append(label)
         labels.append(list(['', '', '']))
-        current_label = str(self.sensor_data[i][LABEL_FIELD])
-        current_user = str(self.sensor_data[i][USER_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i > 0 and len(labels) < 10 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.label_search_delta:
-            if str(self.sensor_data[i][LABEL_FIELD]) != current_label \
-                    or str(self.sensor_data[i][USER_FIELD]) != current_user:
-                skip_label = False
-                # If the current labels are None and the last annotation label was None,
-                # then go ahead and skip adding this line (the last line was an isolated
-                # user label instance).
-                if self.sensor_data[i][LABEL_FIELD] is None \
-                        and self.sensor_data[i][USER_FIELD] is None \
-                        and current_label == str(None):
-                    skip_label = True
-                if not skip_label:
-                    labels.append(self.build_string_line(
-                        stamp=self.sensor_data[i]['stamp'],
-                        label=self.sensor_data[i][LABEL_FIELD],
-                        user_label=self.sensor_data[i][USER_FIELD]))
-                current_label = str(self.sensor_data[i][LABEL_FIELD])
-                current_user = str(self.sensor_data[i][USER_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                labels.append(list(['', '...', '']))
-            i -= 1
+        self.append_label_changes(labels=labels, i=i, step=-1, max_len=10)
 
         labels.reverse()
         i = data_window.i_last
-        label = self.build_string_line(stamp=self.sensor_data[i]['stamp'],
-                                       label=self.sensor_data[i][LABEL_FIELD],
-                                       user_label=self.sensor_data[i][USER_FIELD])
+        label = self.build_string_line(stamp=self.stamps[i],
+                                       label=self.labels[i],
+                                       user_label=self.user_labels[i])
         label[0] = '> ' + label[0]
         labels.append(label)
         labels.append(list(['', '', '']))
-        current_label = str(self.sensor_data[i][LABEL_FIELD])
-        current_user = str(self.sensor_data[i][USER_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i < self.data_size and len(labels) < 20 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.label_search_delta:
-            if str(self.sensor_data[i][LABEL_FIELD]) != current_label \
-                    or str(self.sensor_data[i][USER_FIELD]) != current_user:
-                skip_label = False
-                # If the current labels are None and the last annotation label was None,
-                # then go ahead and skip adding this line (the last line was an isolated
-                # user label instance).
-                if self.sensor_data[i][LABEL_FIELD] is None \
-                        and self.sensor_data[i][USER_FIELD] is None \
-                        and current_label == str(None):
-                    skip_label = True
-                if not skip_label:
-                    labels.append(self.build_string_line(
-                        stamp=self.sensor_data[i]['stamp'],
-                        label=self.sensor_data[i][LABEL_FIELD],
-                        user_label=self.sensor_data[i][USER_FIELD]))
-                current_label = str(self.sensor_data[i][LABEL_FIELD])
-                current_user = str(self.sensor_data[i][USER_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                labels.append(list(['', '...', '']))
-            i += 1
+        self.append_label_changes(labels=labels, i=i, step=1, max_len=20)
 
         return labels
 
+    def append_label_changes(self, labels: list, i: int, step: int, max_len: int):
+        self.append_changes(lines=labels,
+                            i=i,
+                            step=step,
+                            max_len=max_len,
+                            columns=list([self.labels, self.user_labels]),
+                            search_delta=self.label_search_delta,
+                            build_line=self.build_label_change_line,
+                            dots=list(['', '...', '']))
+        return
+
+    def build_label_change_line(self, row: int, previous: int):
+        # If the current labels are None and the last annotation label was None, then go ahead
+        # and skip adding this line (the last line was an isolated user label instance).
+        line = None
+        if self.labels[row] is not None or self.user_labels[row] is not None \
+                or self.labels[previous] is not None:
+            line = self.build_string_line(stamp=self.stamps[row],
+                                          label=self.labels[row],
+                                          user_label=self.user_labels[row])
+        return line
+
+    def append_changes(self, lines: list, i: int, step: int, max_len: int, columns: list,
+                       search_delta: datetime.timedelta, build_line, dots: list):
+        # Walk from row i one row at a time in the direction of step (-1 or 1), adding the line
+        # from build_line(row, previous) where any of the columns changes (None leaves it out)
+        # and dots for the unchanged rows between them. Stops at max_len lines, the first row,
+        # the end of the data, or once a row is search_delta or more away from row i. The rows
+        # are compared in numpy blocks so long unchanged stretches never run through Python one
+        # row at a time.
+        start_time = self.stamp_times[i]
+        search_delta = np.timedelta64(search_delta)
+        end = 0 if step < 0 else self.data_size
+        first_row = i
+        added_dots = False
+        while i != end and len(lines) < max_len:
+            if step < 0:
+                stop = max(i - LABEL_SCAN_BLOCK, end)
+            else:
+                stop = min(i + LABEL_SCAN_BLOCK, end)
+            rows = np.arange(i, stop, step)
+            out_of_time = np.flatnonzero(np.abs(self.stamp_times[rows] - start_time)
+                                         >= search_delta)
+            if len(out_of_time) > 0:
+                rows = rows[:out_of_time[0]]
+                stop = end
+                if len(rows) == 0:
+                    break
+            # Each row is compared with the one visited before it, the first row with itself.
+            previous = rows - step
+            if rows[0] == first_row:
+                previous[0] = first_row
+            changed = np.zeros(len(rows), dtype=bool)
+            for column in columns:
+                changed |= np.not_equal(column[rows], column[previous])
+            # Only changes and the first unchanged row after each one add a line.
+            after_change = np.empty(len(rows), dtype=bool)
+            after_change[0] = not added_dots
+            after_change[1:] = changed[:-1]
+            for k in np.flatnonzero(changed | after_change):
+                if len(lines) >= max_len:
+                    break
+                if changed[k]:
+                    line = build_line(rows[k], previous[k])
+                    if line is not None:
+                        lines.append(line)
+                else:
+                    lines.append(list(dots))
+            added_dots = not changed[-1]
+            i = stop
+        return
+
     @staticmethod
     def build_note_line(stamp: datetime.datetime, note: str) -> list:
         if note is None:
@@ -356,100 +298,62 @@ class FullSensorData:
 
     def get_note_text(self) -> list:
         notes = list()
-        i = self.index + self.sensor_window - 1
-        note = self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                    note=self.sensor_data[i][NOTE_FIELD])
+        i = self.index + self.window - 1
+        note = self.build_note_line(stamp=self.stamps[i],
+                                    note=self.notes[i])
         note[0] = '> ' + note[0]
         notes.append(note)
         notes.append(list(['', '']))
-        current_note = str(self.sensor_data[i][NOTE_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i > 0 and len(notes) < 10 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.notes_search_delta:
-            if str(self.sensor_data[i][NOTE_FIELD]) != current_note:
-                notes.append(self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                                  note=self.sensor_data[i][NOTE_FIELD]))
-                current_note = str(self.sensor_data[i][NOTE_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                notes.append(list(['', '...']))
-            i -= 1
-
-        i = self.index + self.sensor_window - 1
+        self.append_note_changes(notes=notes, i=i, step=-1, max_len=10)
+
         notes.reverse()
         notes.append(list(['', '']))
-        current_note = str(self.sensor_data[i][NOTE_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i < self.data_size and len(notes) < 20 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.notes_search_delta:
-            if str(self.sensor_data[i][NOTE_FIELD]) != current_note:
-                notes.append(self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                                  note=self.sensor_data[i][NOTE_FIELD]))
-                current_note = str(self.sensor_data[i][NOTE_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                notes.append(list(['', '...']))
-            i += 1
+        self.append_note_changes(notes=notes, i=i, step=1, max_len=20)
 
         return notes
 
     def get_given_note_text(self, data_window: SingleDataWindow) -> list:
         notes = list()
         i = data_window.i_start
-        note = self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                    note=self.sensor_data[i][NOTE_FIELD])
+        note = self.build_note_line(stamp=self.stamps[i],
+                                    note=self.notes[i])
         note[0] = '> ' + note[0]
         notes.append(note)
         notes.append(list(['', '']))
-        current_note = str(self.sensor_data[i][NOTE_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i > 0 and len(notes) < 10 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.notes_search_delta:
-            if str(self.sensor_data[i][NOTE_FIELD]) != current_note:
-                notes.append(self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                                  note=self.sensor_data[i][NOTE_FIELD]))
-                current_note = str(self.sensor_data[i][NOTE_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                notes.append(list(['', '...']))
-            i -= 1
+        self.append_note_changes(notes=notes, i=i, step=-1, max_len=10)
 
         notes.reverse()
         i = data_window.i_last
-        note = self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                    note=self.sensor_data[i][NOTE_FIELD])
+        note = self.build_note_line(stamp=self.stamps[i],
+                                    note=self.notes[i])
         note[0] = '> ' + note[0]
         notes.append(note)
         notes.append(list(['', '']))
-        current_note = str(self.sensor_data[i][NOTE_FIELD])
-        start_stamp = copy.deepcopy(self.sensor_data[i]['stamp'])
-        added_dots = False
-        while i < self.data_size and len(notes) < 20 and \
-                abs(self.sensor_data[i]['stamp'] - start_stamp) < self.notes_search_delta:
-            if str(self.sensor_data[i][NOTE_FIELD]) != current_note:
-                notes.append(self.build_note_line(stamp=self.sensor_data[i]['stamp'],
-                                                  note=self.sensor_data[i][NOTE_FIELD]))
-                current_note = str(self.sensor_data[i][NOTE_FIELD])
-                added_dots = False
-            elif not added_dots:
-                added_dots = True
-                notes.append(list(['', '...']))
-            i += 1
+        self.append_note_changes(notes=notes, i=i, step=1, max_len=20)
 
         return notes
 
+    def append_note_changes(self, notes: list, i: int, step: int, max_len: int):
+        self.append_changes(lines=notes,
+                            i=i,
+                            step=step,
+                            max_len=max_len,
+                            columns=list([self.notes]),
+                            search_delta=self.notes_search_delta,
+                            build_line=self.build_note_change_line,
+                            dots=list(['', '...']))
+        return
+
+    def build_note_change_line(self, row: int, previous: int) -> list:
+        return self.build_note_line(stamp=self.stamps[row],
+                                    note=self.notes[row])
+
     def plot_given_window(self, data_window: SingleDataWindow, axis1, axis2, axis3, axis4):
         # Save the current settings to restore after plotting.
-        tmp_sensor_window = self.sensor_window
+        tmp_window = self.window
         tmp_index = self.index
         self.index = data_window.i_start
-        self.sensor_window = abs(data_window.i_last - data_window.i_start)
+        self.window = abs(data_window.i_last - data_window.i_start)
 
         # Now call the plot function.
         self.plot_sensors(axis1=axis1,
@@ -458,127 +362,101 @@ class FullSensorData:
                           axis4=axis4)
 
         # Restore the settings.
-        self.sensor_window = tmp_sensor_window
+        self.window = tmp_window
         self.index = tmp_index
         return
 
     def plot_sensors(self, axis1, axis2, axis3, axis4):
-        x = np.array(list(range(self.sensor_window)))
-        index_range = list(range(self.index, self.index + self.sensor_window))
-        # Annotations or notes.
-        user_ann_x = list()
-        user_ann_y = list()
-        user_ann_color = list()
-        user_ann_found = False
-        ann_x = list()
-        ann_y = list()
-        ann_color = list()
-        ann_found = False
-        note_x = list()
-        note_y = list()
-        note_found = False
-        batt_x = list()
-        batt_y = list()
-        batt_found = False
-        zero = list()
-        for j, i in enumerate(index_range):
-            zero.append(-0.5)
-            if self.sensor_data[i][USER_FIELD] is not None:
-                user_ann_x.append(j)
-                user_ann_y.append(self.ann_y[self.sensor_data[i][USER_FIELD]])
-                user_ann_color.append(self.ann_colors[self.sensor_data[i][USER_FIELD]])
-                user_ann_found = True
-            if self.sensor_data[i][LABEL_FIELD] is not None:
-                ann_x.append(j)
-                ann_y.append(self.ann_y[self.sensor_data[i][LABEL_FIELD]])
-                ann_color.append(self.ann_colors[self.sensor_data[i][LABEL_FIELD]])
-                ann_found = True
-            if self.sensor_data[i][NOTE_FIELD] is not None:
-                note_x.append(j)
-                note_y.append(-1)
-                note_found = True
-            if self.sensor_data[i][BATTERY_FIELD] is not None:
-                if self.sensor_data[i][BATTERY_FIELD] == BATTERY_CHARGING:
-                    batt_x.append(j)
-                    batt_y.append(-0.5)
-                    batt_found = True
+        if self.ann_list_dirty:
+            self.update_ann_list()
+        x = np.arange(self.window)
+        window = slice(self.index, self.index + self.window)
+        # Annotations or notes, found with one mask per column over the window. A label's
+        # position in the sorted ann_list is both its y value and the index of its colour.
+        user_labels = self.user_labels[window]
+        user_ann_x = np.flatnonzero(np.not_equal(user_labels, None))
+        user_ann_y = np.searchsorted(self.ann_list, user_labels[user_ann_x])
+        user_ann_color = self.ann_color_array[user_ann_y].tolist()
+        labels = self.labels[window]
+        ann_x = np.flatnonzero(np.not_equal(labels, None))
+        ann_y = np.searchsorted(self.ann_list, labels[ann_x])
+        ann_color = self.ann_color_array[ann_y].tolist()
+        note_x = np.flatnonzero(np.not_equal(self.notes[window], None))
+        batt_x = np.flatnonzero(self.columns[BATTERY_FIELD][window] == BATTERY_CHARGING)
         # Clear some points to draw if window sizes get big.
-        if self.sensor_window > 300:
-            if len(note_x) > 10:
-                rm_list = list(range((len(note_x) - 1), 0, -2))
-                for i in rm_list:
-                    del note_x[i]
-                    del note_y[i]
-            if len(batt_x) > 10:
-                rm_list = list(range((len(batt_x) - 1), 0, -2))
-                for i in rm_list:
-                    del batt_x[i]
-                    del batt_y[i]
-        if self.sensor_window > 900:
-            if len(note_x) > 10:
-                rm_list = list(range((len(note_x) - 1), 0, -2))
-                for i in rm_list:
-                    del note_x[i]
-                    del note_y[i]
-            if len(batt_x) > 10:
-                rm_list = list(range((len(batt_x) - 1), 0, -2))
-                for i in rm_list:
-                    del batt_x[i]
-                    del batt_y[i]
-        axis1.scatter(x, np.array(zero), color='white', marker='.')
-        if ann_found:
+        if self.window > 300:
+            note_x = self.thin_points(x=note_x)
+            batt_x = self.thin_points(x=batt_x)
+        if self.window > 900:
+            note_x = self.thin_points(x=note_x)
+            batt_x = self.thin_points(x=batt_x)
+        axis1.scatter(x, np.full(self.window, -0.5), color='white', marker='.')
+        if len(ann_x) > 0:
             axis1.scatter(ann_x, ann_y, s=80, c=ann_color, marker='|')
         for key in list(self.ann_y.keys()):
             axis1.annotate(key, xy=(0, self.ann_y[key]), color=self.ann_colors[key])
-        if note_found:
-            axis1.scatter(note_x, note_y, s=80, c='green', marker='^')
-        if batt_found:
-            axis1.scatter(batt_x, batt_y, s=5, c='red', marker='>')
-        if user_ann_found:
+        if len(note_x) > 0:
+            axis1.scatter(note_x, np.full(len(note_x), -1), s=80, c='green', marker='^')
+        if len(batt_x) > 0:
+            axis1.scatter(batt_x, np.full(len(batt_x), -0.5), s=5, c='red', marker='>')
+        if len(user_ann_x) > 0:
             axis1.scatter(user_ann_x, user_ann_y, s=140, c=user_ann_color, marker='o')
         axis1.autoscale_view()
         axis1.set_ylabel(ylabel='labels')
         axis1.set_ylim(bottom=-1, top=len(self.ann_colors))
 
         # yaw, pitch, roll
-        yaw = np.array([self.sensor_data[i]['yaw'] for i in index_range])
-        pitch = np.array([self.sensor_data[i]['pitch'] for i in index_range])
-        roll = np.array([self.sensor_data[i]['roll'] for i in index_range])
-        axis2.plot(x, yaw, label='yaw')
-        axis2.plot(x, pitch, label='pitch')
-        axis2.plot(x, roll, label='roll')
+        self.plot_trace(axis=axis2, field='yaw', x=x, window=window, label='yaw')
+        self.plot_trace(axis=axis2, field='pitch', x=x, window=window, label='pitch')
+        self.plot_trace(axis=axis2, field='roll', x=x, window=window, label='roll')
         self.adjust_axes(axis=axis2,
                          label='yaw/pitch/roll')
 
         # rotation_rate_x, rotation_rate_y, rotation_rate_z
-        rotation_rate_x = np.array([self.sensor_data[i]['rotation_rate_x'] for i in index_range])
-        rotation_rate_y = np.array([self.sensor_data[i]['rotation_rate_y'] for i in index_range])
-        rotation_rate_z = np.array([self.sensor_data[i]['rotation_rate_z'] for i in index_range])
-        axis3.plot(x, rotation_rate_x, label='x')
-        axis3.plot(x, rotation_rate_y, label='y')
-        axis3.plot(x, rotation_rate_z, label='z')
+        self.plot_trace(axis=axis3, field='rotation_rate_x', x=x, window=window, label='x')
+        self.plot_trace(axis=axis3, field='rotation_rate_y', x=x, window=window, label='y')
+        self.plot_trace(axis=axis3, field='rotation_rate_z', x=x, window=window, label='z')
         self.adjust_axes(axis=axis3,
                          label='rotation rate')
 
         # user_acceleration_x, user_acceleration_y, user_acceleration_z
-        user_acc_x = np.array([self.sensor_data[i]['user_acceleration_x'] for i in index_range])
-        user_acc_y = np.array([self.sensor_data[i]['user_acceleration_y'] for i in index_range])
-        user_acc_z = np.array([self.sensor_data[i]['user_acceleration_z'] for i in index_range])
-        axis4.plot(x, user_acc_x, label='x')
-        axis4.plot(x, user_acc_y, label='y')
-        axis4.plot(x, user_acc_z, label='z')
+        self.plot_trace(axis=axis4, field='user_acceleration_x', x=x, window=window, label='x')
+        self.plot_trace(axis=axis4, field='user_acceleration_y', x=x, window=window, label='y')
+        self.plot_trace(axis=axis4, field='user_acceleration_z', x=x, window=window, label='z')
         self.adjust_axes(axis=axis4,
                          label='user acceleration')
         axis4.set_xlabel(xlabel='{}  ->  {}  (NOW)'.format(
-            str(self.sensor_data[self.index]['stamp']),
-            str(self.sensor_data[self.index + self.sensor_window - 1]['stamp'])))
+            str(self.stamps[self.index]),
+            str(self.stamps[self.index + self.window - 1])))
+        return
+
+    @staticmethod
+    def thin_points(x: np.ndarray) -> np.ndarray:
+        # Drop every other point counting back from the end, always keeping the first one.
+        if len(x) > 10:
+            position = np.arange(len(x))
+            x = x[((len(x) - 1 - position) % 2 == 1) | (position == 0)]
+        return x
+
+    def plot_trace(self, axis, field: str, x: np.ndarray, window: slice, label: str):
+        # Move the line for this field to the new window, or draw it again if the axis was
+        # cleared since it was last drawn.
+        y = self.columns[field][window]
+        line = self.trace_lines.get((axis, field))
+        if line is None or line not in axis.lines:
+            self.trace_lines[(axis, field)] = axis.plot(x, y, label=label)[0]
+        else:
+            line.set_data(x, y)
         return
 
     def adjust_axes(self, axis, label):
         # This adjusts an axis and makes the most it will zoom in to be -1.0 to 1.0.
-        axis.autoscale_view()
+        # The lines may have been moved in place, so rescale to their current data and turn
+        # autoscaling back on after the last set_ylim turned it off.
+        axis.relim()
+        axis.autoscale()
         bottom, top = axis.get_ylim()
-        axis.set_ylim(bottom=min([bottom, -1.0]),
+        axis.set_ylim(bottom=min(bottom, -1.0),
                       top=max(top, 1.0))
         axis.set_ylabel(ylabel=label)
         axis.legend(loc='upper left')
@@ -586,44 +464,50 @@ class FullSensorData:
 
     def update_ann_list(self):
         # This assumes you have added any possible new value to the set already.
-        del self.ann_list
-        self.ann_list = list(self.ann_set)
-        self.ann_list.sort()
-        del self.ann_colors
-        self.ann_colors = dict()
-        del self.ann_y
-        self.ann_y = dict()
-        ann_len = len(self.ann_list) - 1
+        self.ann_list.clear()
+        self.ann_list.extend(sorted(self.ann_set))
+        self.ann_colors.clear()
+        self.ann_y.clear()
         for i, ann in enumerate(self.ann_list):
             self.ann_colors[ann] = self.color_map[i % len(self.color_map)]
             self.ann_y[ann] = i
+        self.ann_color_array = np.array([self.ann_colors[ann] for ann in self.ann_list],
+                                        dtype=object)
+        self.ann_list_dirty = False
         return
 
     def load_data(self, filename: str, gps_data: WatchGPSData, update_callback=None,
                   done_callback=None):
+        # Count the lines for the progress messages by scanning the raw bytes, which is much
+        # faster than decoding the file and iterating it line by line.
         fsize = -1
-        with open(filename, 'r') as mdata:
-            for line in mdata:
-                fsize += 1
-        del self.sensor_data
-        self.sensor_data = list()
-        del self.ann_set
-        self.ann_set = set()
-        del self.ann_list
-        self.ann_list = list()
-        del self.ann_colors
-        self.ann_colors = dict()
-        del self.ann_y
-        self.ann_y = dict()
+        last_byte = b'\n'
+        with open(filename, 'rb') as mdata:
+            for chunk in iter(functools.partial(mdata.read, LINE_COUNT_CHUNK), b''):
+                fsize += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+        if last_byte != b'\n':
+            # The last line has no newline but still counts.
+            fsize += 1
+        self.columns = dict()
+        self.stamps = np.empty(0, dtype=object)
+        self.stamp_times = np.empty(0, dtype='datetime64[us]')
+        self.labels = np.empty(0, dtype=object)
+        self.user_labels = np.empty(0, dtype=object)
+        self.notes = np.empty(0, dtype=object)
+        self.ann_set.clear()
+        self.ann_list.clear()
+        self.ann_colors.clear()
+        self.ann_y.clear()
         self.has_data = False
         self.data_has_changed = False
         self.index = 0
         self.data_size = 0
-        self.sensor_window = DEFAULT_SENSOR_WINDOW
+        self.window = DEFAULT_SENSOR_WINDOW
         gps_data.load_data_init()
         with MobileData(filename, 'r') as mdata:
-            del self.fields
-            self.fields = copy.deepcopy(mdata.fields)
+            # The field types are plain strings, so a shallow copy keeps mdata untouched.
+            self.fields = OrderedDict(mdata.fields)
             has_user = True
             if USER_FIELD not in self.fields:
                 has_user = False
@@ -640,62 +524,88 @@ class FullSensorData:
             if NOTE_FIELD not in self.fields:
                 has_notes = False
                 self.fields[NOTE_FIELD] = 's'
-            count = 0
-            cur_lat = -1.0
-            cur_lon = -1.0
-            for row in mdata.rows_dict:
-                if (count % 1000) == 0:
-                    msg = 'Loading file...\n'
-                    percent = float(int(1000.0 * float(count) / float(fsize))) / 10.0
-                    msg += '{}% complete. {} of {} rows loaded\n'.format(percent, count, fsize)
-                    msg += 'At stamp: {}'.format(str(row['stamp']))
-                    if update_callback is not None:
-                        update_callback(msg)
-                        time.sleep(0.001)
-                if not has_user:
-                    row[USER_FIELD] = None
-                if not has_label:
-                    row[LABEL_FIELD] = None
-                if not has_gps_valid:
-                    row[GPS_VALID_FIELD] = GPS_VALID_DICT[DEFAULT_IS_VALID]
-                if not has_notes:
-                    row[NOTE_FIELD] = None
-
-                if row[USER_FIELD] is not None:
-                    self.ann_set.add(row[USER_FIELD])
-                if row[LABEL_FIELD] is not None:
-                    self.ann_set.add(row[LABEL_FIELD])
-                    # print(str(row['stamp']), row[LABEL_FIELD])
-
-                # Add copy of row to our sensor data.
-                self.sensor_data.append(copy.deepcopy(row))
-
-                # Add or update GPS data if it passes logic checks.
-                if row['latitude'] is not None and row['longitude'] is not None:
-                    if row['latitude'] != cur_lat or row['longitude'] != cur_lon:
-                        gps_data.gps_data.append(
-                            GPSData(longitude=row['longitude'],
-                                    latitude=row['latitude'],
-                                    start_stamp=row['stamp'],
-                                    last_stamp=row['stamp'],
-                                    count=1,
-                                    is_valid=GPS_VALID_DICT[row[GPS_VALID_FIELD]],
-                                    first_index=count,
-                                    last_index=count))
-                        gps_data.has_data = True
-                        cur_lat = row['latitude']
-                        cur_lon = row['longitude']
-                    elif gps_data.has_data:
-                        gps_data.gps_data[-1].count += 1
-                        gps_data.gps_data[-1].last_stamp = copy.deepcopy(row['stamp'])
-                        gps_data.gps_data[-1].last_index = count
-                count += 1
+            file_fields = list(mdata.fields.items())
+            datetime_format = mdata.datetime_format
+
+        # MobileData has read the two header rows, pandas parses the rest in bulk one chunk at a
+        # time so the progress messages still come through. It is imported here so starting the
+        # viewer does not wait on it.
+        import pandas as pd
+        pieces = dict([(field, list()) for field, field_type in file_fields])
+        count = 0
+        last_percent = -1
+        reader = pd.read_csv(filename, header=None, skiprows=2,
+                             names=[field for field, field_type in file_fields],
+                             dtype=dict([(field, np.float64 if field_type == 'f' else str)
+                                         for field, field_type in file_fields]),
+                             keep_default_na=False, na_values=[''],
+                             float_precision='round_trip', chunksize=LOAD_CHUNK_ROWS)
+        for chunk in reader:
+            for field, field_type in file_fields:
+                values = chunk[field]
+                if field_type == 'f':
+                    # Missing values become NaN, which matplotlib leaves as a gap in the line.
+                    column = values.to_numpy(dtype=np.float64)
+                elif field_type == 'dt':
+                    column = pd.to_datetime(values.to_numpy(),
+                                            format=datetime_format).to_pydatetime()
+                    column[values.isna().to_numpy()] = None
+                else:
+                    # Text fields such as the labels and battery state only hold a handful of
+                    # distinct values, so share one string object per value across the rows.
+                    column = np.array([sys.intern(value) if isinstance(value, str) else None
+                                       for value in values.tolist()], dtype=object)
+                pieces[field].append(column)
+            count += len(chunk)
+            percent = float(int(1000.0 * float(count) / float(fsize))) / 10.0
+            # Only update when the whole percent moves.
+            if update_callback is not None and int(percent) != last_percent:
+                last_percent = int(percent)
+                msg = 'Loading file...\n'
+                msg += '{}% complete. {} of {} rows loaded\n'.format(percent, count, fsize)
+                msg += 'At stamp: {}'.format(str(pieces['stamp'][-1][-1]))
+                update_callback(msg)
+                # Give the GUI thread a chance to show the progress without a fixed delay.
+                time.sleep(0)
+
+        if count > 0:
+            columns = dict([(field, np.concatenate(pieces[field]))
+                            for field, field_type in file_fields])
+            del pieces
+            if not has_user:
+                columns[USER_FIELD] = np.full(count, None, dtype=object)
+            if not has_label:
+                columns[LABEL_FIELD] = np.full(count, None, dtype=object)
+            if not has_gps_valid:
+                columns[GPS_VALID_FIELD] = np.full(count, GPS_VALID_DICT[DEFAULT_IS_VALID],
+                                                   dtype=object)
+            if not has_notes:
+                columns[NOTE_FIELD] = np.full(count, None, dtype=object)
+            self.columns = columns
+            self.stamps = columns['stamp']
+            self.stamp_times = self.stamps.astype('datetime64[us]')
+            self.labels = columns[LABEL_FIELD]
+            self.user_labels = columns[USER_FIELD]
+            self.notes = columns[NOTE_FIELD]
+
+            self.ann_set.update(self.labels)
+            self.ann_set.update(self.user_labels)
+            self.ann_set.discard(None)
 
         self.update_ann_list()
         print(self.ann_list)
-        if len(self.sensor_data) > 0:
-            gps_data.load_data_end()
-            self.data_size = len(self.sensor_data)
+        if count > 0:
+            # Hand the rows that have a position over to the GPS data.
+            latitude = self.columns['latitude']
+            longitude = self.columns['longitude']
+            has_position = ~(np.isnan(latitude) | np.isnan(longitude))
+            gps_data.load_data_end(latitude=latitude[has_position],
+                                   longitude=longitude[has_position],
+                                   stamps=self.stamps[has_position],
+                                   is_valid=(self.columns[GPS_VALID_FIELD][has_position]
+                                             == GPS_VALID_DICT[True]),
+                                   indices=np.flatnonzero(has_position))
+            self.data_size = count
             self.has_data = True
             self.data_has_changed = False
             self.apply_window_variable_logic()
@@ -706,17 +616,38 @@ class FullSensorData:
             print('No changes to GPS labels, nothing to merge!')
         else:
             self.data_has_changed = True
-            for gps_row in gps_data.gps_data:
-                msg = 'Merging GPS data changes to Sensor data...\n'
-                percent = float(int(1000.0 * gps_row.first_index / self.data_size)) / 10.0
-                msg += 'At {}% of data.\n'.format(percent)
-                msg += '{}'.format(str(gps_row.start_stamp))
-                update_callback(msg)
-                for i in range(gps_row.first_index, gps_row.last_index + 1):
-                    self.sensor_data[i][GPS_VALID_FIELD] = GPS_VALID_DICT[gps_row.is_valid]
+            last_update = None
+            for first_index, last_index, start_stamp, valid in zip(
+                    gps_data.first_index.tolist(), gps_data.last_index.tolist(),
+                    gps_data.start_stamp, gps_data.is_valid.tolist()):
+                # Runs are often only a few rows long, so limit the GUI updates by time instead.
+                now = time.monotonic()
+                if last_update is None or (now - last_update) >= PROGRESS_UPDATE_SECONDS:
+                    last_update = now
+                    msg = 'Merging GPS data changes to Sensor data...\n'
+                    percent = float(int(1000.0 * first_index / self.data_size)) / 10.0
+                    msg += 'At {}% of data.\n'.format(percent)
+                    msg += '{}'.format(str(start_stamp))
+                    update_callback(msg)
+                self.columns[GPS_VALID_FIELD][first_index:last_index + 1] = GPS_VALID_DICT[valid]
             gps_data.data_has_changed = False
         return
 
+    @staticmethod
+    def format_column(column: np.ndarray, field_type: str, datetime_format: str) -> list:
+        # Turn a column into the strings MobileData.write_row would write for it, with the
+        # missing values as empty strings.
+        if field_type == 'f':
+            values = list(map(str, column.tolist()))
+            for i in np.flatnonzero(np.isnan(column)).tolist():
+                values[i] = ''
+        elif field_type == 'dt':
+            values = ['' if value is None else value.strftime(datetime_format)
+                      for value in column]
+        else:
+            values = ['' if value is None else str(value) for value in column]
+        return values
+
     def save_data(self, filename: str, update_callback=None, done_callback=None):
         if not self.data_has_changed:
             print('No changes to our data, nothing to save!')
@@ -725,15 +656,24 @@ class FullSensorData:
                 mdata.set_fields(fields=self.fields)
                 mdata.write_headers()
 
-                count = 0
-                for row in self.sensor_data:
-                    if (count % 500) == 0:
+                # Format a chunk of rows at a time, one column at a time, and hand the rows to
+                # the csv writer together rather than converting every value in write_row.
+                last_update = None
+                for start in range(0, self.data_size, SAVE_CHUNK_ROWS):
+                    now = time.monotonic()
+                    if last_update is None or (now - last_update) >= PROGRESS_UPDATE_SECONDS:
+                        last_update = now
                         msg = 'Saving to data file...\n'
-                        percent = float(int(1000.0 * count / self.data_size)) / 10.0
+                        percent = float(int(1000.0 * start / self.data_size)) / 10.0
                         msg += 'At {}% of the data...'.format(percent)
                         update_callback(msg)
-                    mdata.write_row_dict(vals_dict=row)
-                    count += 1
+                    chunk = slice(start, start + SAVE_CHUNK_ROWS)
+                    columns = list()
+                    for field, field_type in self.fields.items():
+                        columns.append(self.format_column(column=self.columns[field][chunk],
+                                                          field_type=field_type,
+                                                          datetime_format=mdata.datetime_format))
+                    mdata.csv.writerows(zip(*columns))
 
             self.data_has_changed = False
 
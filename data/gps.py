@@ -16,65 +16,120 @@
 # **
 # ** Contact: Brian L. Thomas (bthomas1@wsu.edu)
 # *****************************************************************************#
-import copy
-import datetime
+import functools
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
-import geopandas as gpd
-import contextily as cx
-from shapely.geometry import Point, LineString
-import matplotlib.pyplot as plt
+import mercantile as mt
+from xyzservices import providers
 from .config import VizConfig
 from .annotate import SingleDataWindow
+from .windowed import WindowedData
 
 # plt.style.use('ggplot')
 # plt.rcParams.update({'font.size': 16,
 #                      'axes.labelweight': 'bold',
 #                      'figure.figsize': (6, 6),
 #                      'axes.edgecolor': '0.2'})
-cx.set_cache_dir(path='data/contextily_cache')
-
-
-class GPSData:
-    def __init__(self, longitude: float, latitude: float, start_stamp: datetime.datetime,
-                 last_stamp: datetime.datetime, count: int, is_valid: bool, first_index: int,
-                 last_index: int):
-        self.longitude = longitude
-        self.latitude = latitude
-        self.start_stamp = copy.deepcopy(start_stamp)
-        self.last_stamp = copy.deepcopy(last_stamp)
-        self.count = count
-        self.is_valid = is_valid
-        self.first_index = first_index
-        self.last_index = last_index
-        return
+# Set to True to print the window math while plotting.
+DEBUG = False
+# Number of windows along the track to prefetch basemap tiles for after loading, when the
+# warm_tile_cache setting is on.
+WARM_TILE_SAMPLES = 25
+# Worker threads that build the basemaps one step ahead and behind the current window.
+PREFETCH_WORKERS = 2
+# Marker colors for valid and invalid GPS points, matplotlib's 'g' and 'r' as RGBA.
+VALID_COLOR = (0.0, 0.5, 0.0, 1.0)
+INVALID_COLOR = (1.0, 0.0, 0.0, 1.0)
+# Tile provider for the map drawn under the GPS track.
+BASEMAP_SOURCE = providers.OpenStreetMap.Mapnik
+# Number of merged basemap images kept in memory, one per zoom level and tile range.
+BASEMAP_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=None)
+def load_contextily():
+    # contextily pulls in rasterio and friends, so it is only imported once a map is needed.
+    import contextily
+    contextily.set_cache_dir(path='data/contextily_cache')
+    return contextily
+
+
+@functools.lru_cache(maxsize=None)
+def web_mercator_transformer():
+    # Projects longitude/latitude arrays to the web mercator coordinates used by the basemap.
+    from pyproj import Transformer
+    return Transformer.from_crs('EPSG:4326', 'EPSG:3857', always_xy=True)
+
+
+def basemap_tiles(minx: float, maxx: float, miny: float, maxy: float) -> tuple:
+    # The (zoom, west, north, east, south) tile range contextily would fetch for this view.
+    w, s = mt.lnglat(minx, miny)
+    e, n = mt.lnglat(maxx, maxy)
+    # Same automatic zoom as contextily, clipped to the zoom levels the provider serves.
+    zoom = int(np.ceil(np.log2(720.0 / max(e - w, n - s))))
+    zoom = min(max(zoom, BASEMAP_SOURCE.get('min_zoom', 0)), BASEMAP_SOURCE.get('max_zoom', 19))
+    tiles = list(mt.tiles(w, s, e, n, [zoom]))
+    return (zoom,
+            min(tile.x for tile in tiles),
+            min(tile.y for tile in tiles),
+            max(tile.x for tile in tiles),
+            max(tile.y for tile in tiles))
+
+
+@functools.lru_cache(maxsize=BASEMAP_CACHE_SIZE)
+def fetch_basemap(zoom: int, west: int, north: int, east: int, south: int) -> tuple:
+    # Merged image and extent for a tile range. Small steps usually stay inside the same range,
+    # so this skips reading and merging the tiles again.
+    w, n = mt.ul(west + 0.5, north + 0.5, zoom)
+    e, s = mt.ul(east + 0.5, south + 0.5, zoom)
+    return load_contextily().bounds2img(w, s, e, n, zoom=zoom, source=BASEMAP_SOURCE, ll=True)
 
 
-class WatchGPSData:
+class WatchGPSData(WindowedData):
     def __init__(self):
-        self.has_data = False
-        self.data_has_changed = False
-        self.index = 0
-        self.data_size = 0
-        self.gps_data = list()
-        self.gps_window = 10
-        self.window_size_adj_rate = 1
-        self.step_delta_rate = 1
+        super().__init__(window=10, window_size_adj_rate=1, step_delta_rate=1)
+        # One entry per GPS run (consecutive rows at the same position).
+        self.latitude = np.empty(0, dtype=np.float64)
+        self.longitude = np.empty(0, dtype=np.float64)
+        self.is_valid = np.empty(0, dtype=bool)
+        self.start_stamp = np.empty(0, dtype=object)
+        self.last_stamp = np.empty(0, dtype=object)
+        self.count = np.empty(0, dtype=np.int64)
+        self.first_index = np.empty(0, dtype=np.int64)
+        self.last_index = np.empty(0, dtype=np.int64)
+        self.merc_x = np.empty(0, dtype=np.float64)
+        self.merc_y = np.empty(0, dtype=np.float64)
         self.lon_min = 0.0
         self.lon_max = 0.0
         self.lat_min = 0.0
         self.lat_max = 0.0
-        self.geo_data_frame = None
-        self.colors = list()
-        self.sizes = list()
+        # Projected points of the current window, views into merc_x/merc_y.
+        self.window_x = np.empty(0, dtype=np.float64)
+        self.window_y = np.empty(0, dtype=np.float64)
+        # Set when the index or window moved, the frame is rebuilt on the next plot.
+        self.frame_is_stale = False
+        # Artists kept between plot_gps calls so a step only moves the points.
+        self.scatter_artist = None
+        self.line_artist = None
+        self.basemap_artist = None
+        self.plot_bounds = None
+        # Whether to fetch the tiles along the whole track in the background after loading.
+        self.warm_tiles = False
+        self.prefetch_executor = None
+        # The prefetch jobs from the last redraw, keyed by their tile range.
+        self.prefetch_futures = dict()
+        self.colors = np.empty((0, 4), dtype=np.float64)
+        self.sizes = np.empty(0, dtype=np.float64)
         self.fields = None
         return
 
     def update_config(self, wconfig: VizConfig):
-        self.gps_window = wconfig.gps_window_size
+        self.window = wconfig.gps_window_size
         self.window_size_adj_rate = wconfig.gps_win_size_adj_rate
         self.step_delta_rate = wconfig.gps_step_delta_rate
+        self.warm_tiles = wconfig.warm_tile_cache
 
         # Apply critical logic to window sizes.
         self.apply_window_variable_logic()
@@ -87,18 +142,8 @@ class WatchGPSData:
             self.update_gps_data_frame()
         return
 
-    def apply_window_variable_logic(self):
-        if self.has_data:
-            if self.data_size < self.gps_window:
-                self.gps_window = self.data_size
-            if self.data_size < self.window_size_adj_rate:
-                self.window_size_adj_rate = int(self.data_size / 2)
-            if self.data_size < self.step_delta_rate:
-                self.step_delta_rate = int(self.data_size / 2)
-        return
-
     def set_config_obj(self, wconfig: VizConfig):
-        wconfig.gps_window_size = self.gps_window
+        wconfig.gps_window_size = self.window
         wconfig.gps_win_size_adj_rate = self.window_size_adj_rate
         wconfig.gps_step_delta_rate = self.step_delta_rate
         return
@@ -106,203 +151,285 @@ class WatchGPSData:
     def get_first_stamp(self) -> str:
         msg = '...'
         if self.has_data:
-            msg = str(self.gps_data[self.gps_window - 1].last_stamp)
+            msg = str(self.last_stamp[self.window - 1])
         return msg
 
     def get_current_stamp(self) -> str:
         msg = '...'
         if self.has_data:
-            msg = str(self.gps_data[self.index + self.gps_window - 1].last_stamp)
+            msg = str(self.last_stamp[self.index + self.window - 1])
         return msg
 
     def get_last_stamp(self) -> str:
         msg = '...'
         if self.has_data:
-            msg = str(self.gps_data[-1].last_stamp)
+            msg = str(self.last_stamp[-1])
         return msg
 
-    def increase_window_size(self) -> bool:
-        action = False
-        if (self.index + self.gps_window + self.window_size_adj_rate) <= self.data_size:
-            self.gps_window += self.window_size_adj_rate
-            self.update_gps_data_frame()
-            action = True
-        return action
-
-    def decrease_window_size(self) -> bool:
-        action = False
-        if (self.gps_window - self.window_size_adj_rate) >= 1:
-            self.gps_window -= self.window_size_adj_rate
-            self.update_gps_data_frame()
-            action = True
-        return action
-
-    def step_forward(self) -> bool:
-        action = False
-        if (self.index + self.gps_window + self.step_delta_rate) <= self.data_size:
-            self.index += self.step_delta_rate
-            self.update_gps_data_frame()
-            action = True
-        return action
+    @property
+    def gps_window(self) -> int:
+        return self.window
 
-    def step_backward(self) -> bool:
-        action = False
-        if (self.index - self.step_delta_rate) >= 0:
-            self.index -= self.step_delta_rate
-            self.update_gps_data_frame()
-            action = True
-        return action
+    @gps_window.setter
+    def gps_window(self, value: int):
+        self.window = value
+        return
 
-    def goto_index(self, clicked_float: float):
-        if 0.0 <= clicked_float <= 1.0:
-            self.index = int(clicked_float * (self.data_size - self.gps_window))
-            self.update_gps_data_frame()
+    def window_changed(self):
+        # Defer the rebuild so a burst of steps only pays for it once when plotted.
+        self.frame_is_stale = True
         return
 
     def update_gps_data_frame(self):
-        del self.geo_data_frame
-        del self.colors
-        del self.sizes
-        self.colors = list()
-        self.sizes = list()
-        my_points = dict({'point_id': list(),
-                          'Latitude': list(),
-                          'Longitude': list()})
-        j = 0
-        last_stamp = ''
-        for i in range(self.index, self.index + self.gps_window):
-            my_points['point_id'].append(j)
-            my_points['Latitude'].append(self.gps_data[i].latitude)
-            my_points['Longitude'].append(self.gps_data[i].longitude)
-            if self.gps_data[i].is_valid:
-                self.colors.append('g')
-            else:
-                self.colors.append('r')
-            self.sizes.append(20.0)
-            last_stamp = str(self.gps_data[i].last_stamp)
-            j += 1
-        self.sizes[-1] = 80.0
-
-        # print('last stamp:  {}'.format(last_stamp))
-
-        df = pd.DataFrame(my_points)
-        df = gpd.GeoDataFrame(df,
-                              crs="EPSG:4326",
-                              geometry=gpd.points_from_xy(df['Longitude'], df['Latitude']))
-        self.geo_data_frame = df.to_crs(epsg=3857)
-        # print(self.geo_data_frame.info())
-        # print(self.geo_data_frame.head())
+        window = slice(self.index, self.index + self.window)
+        if len(self.sizes) != self.window:
+            # Only reallocate the marker arrays when the window size changes.
+            self.colors = np.empty((self.window, 4), dtype=np.float64)
+            self.sizes = np.full(self.window, 20.0)
+            self.sizes[-1] = 80.0
+        self.colors[:] = INVALID_COLOR
+        self.colors[self.is_valid[window]] = VALID_COLOR
+
+        # The track is already projected, so the window only needs slicing.
+        self.window_x = self.merc_x[window]
+        self.window_y = self.merc_y[window]
+        self.frame_is_stale = False
         return
 
     def mark_window_invalid(self):
-        for i in range(self.index, self.index + self.gps_window):
-            self.gps_data[i].is_valid = False
+        self.is_valid[self.index:self.index + self.window] = False
         self.data_has_changed = True
         self.update_gps_data_frame()
         return
 
     def mark_window_valid(self):
-        for i in range(self.index, self.index + self.gps_window):
-            self.gps_data[i].is_valid = True
+        self.is_valid[self.index:self.index + self.window] = True
         self.data_has_changed = True
         self.update_gps_data_frame()
         return
 
+    @staticmethod
+    def window_bounds(window_x: np.ndarray, window_y: np.ndarray) -> tuple:
+        # A square view around the points with a 10% margin that is never narrower than 300m.
+        minx = window_x.min()
+        maxx = window_x.max()
+        miny = window_y.min()
+        maxy = window_y.max()
+        meanx = (minx + maxx) / 2.0
+        meany = (miny + maxy) / 2.0
+        half = max((maxx - minx) * 1.1, (maxy - miny) * 1.1, 300.0) / 2.0
+        return meanx - half, meanx + half, meany - half, meany + half
+
+    def warm_tile_cache(self):
+        # Fetch the basemap tiles for the whole track and a sample of windows along it, so the
+        # contextily disk cache already has them when the user steps through the data.
+        merc_x = self.merc_x
+        merc_y = self.merc_y
+        data_size = self.data_size
+        window = self.window
+        source = BASEMAP_SOURCE
+        try:
+            cx = load_contextily()
+            cx.bounds2img(merc_x.min(), merc_y.min(), merc_x.max(), merc_y.max(), source=source)
+            step = max(1, (data_size - window) // WARM_TILE_SAMPLES)
+            for i in range(0, data_size - window + 1, step):
+                if self.merc_x is not merc_x:
+                    # A new file was loaded, stop warming the old track.
+                    break
+                minx, maxx, miny, maxy = self.window_bounds(window_x=merc_x[i:i + window],
+                                                            window_y=merc_y[i:i + window])
+                cx.bounds2img(minx, miny, maxx, maxy, source=source)
+        except Exception as e:
+            if DEBUG:
+                print('Unable to warm the map tile cache: {}'.format(e))
+        return
+
     def plot_given_window(self, data_window: SingleDataWindow, axis):
         # Save the current settings to restore after plotting.
-        tmp_gps_window = self.gps_window
+        tmp_window = self.window
         tmp_index = self.index
 
-        # Find values for index and gps_window.
+        # Find values for index and window.
         start = 0
         end = self.data_size - 1
         valid = False
         # First, check if the data_window is outside the gps data.
-        if data_window.i_last < self.gps_data[0].first_index or \
-                self.gps_data[-1].last_index < data_window.i_start:
+        if data_window.i_last < self.first_index[0] or \
+                self.last_index[-1] < data_window.i_start:
             valid = False
         else:
-            for i in range(self.data_size):
-                if self.gps_data[i].first_index < data_window.i_start < self.gps_data[i].last_index:
-                    start = i
-                    valid = True
-                if self.gps_data[i].first_index < data_window.i_last < self.gps_data[i].last_index:
-                    end = i
-                    valid = True
+            # Use the last run that strictly contains each end of the window.
+            inside = np.flatnonzero((self.first_index < data_window.i_start)
+                                    & (data_window.i_start < self.last_index))
+            if len(inside) > 0:
+                start = int(inside[-1])
+                valid = True
+            inside = np.flatnonzero((self.first_index < data_window.i_last)
+                                    & (data_window.i_last < self.last_index))
+            if len(inside) > 0:
+                end = int(inside[-1])
+                valid = True
 
         if valid:
             self.index = start
-            self.gps_window = abs(end - start)
-            if self.gps_window == 0:
-                self.gps_window = 1
-            print('gps index = {}'.format(self.index))
-            print('gps window = {}'.format(self.gps_window))
-            print('start = {}    end = {}'.format(start, end))
+            self.window = abs(end - start)
+            if self.window == 0:
+                self.window = 1
+            if DEBUG:
+                print('gps index = {}'.format(self.index))
+                print('gps window = {}'.format(self.window))
+                print('start = {}    end = {}'.format(start, end))
             self.update_gps_data_frame()
             self.plot_gps(axis=axis)
 
         # Restore the settings.
-        self.gps_window = tmp_gps_window
+        self.window = tmp_window
         self.index = tmp_index
         return
 
     def plot_gps(self, axis):
-        if self.geo_data_frame is not None:
-            axis.set_axis_off()
-            if self.gps_window > 1:
-                self.geo_data_frame['LINE'] = [(LineString([[a.x, a.y], [b.x, b.y]])
-                                                if b is not None else None)
-                                               for (a, b) in zip(self.geo_data_frame.geometry,
-                                                                 self.geo_data_frame.geometry.shift(
-                                                                     -1, axis=0))]
-                geo_line = gpd.GeoDataFrame(self.geo_data_frame, geometry='LINE')
-                geo_line.plot(ax=axis, edgecolor='black', lw=0.2)
-            self.geo_data_frame.plot(ax=axis, color=self.colors, markersize=self.sizes)
-            minx, miny, maxx, maxy = self.geo_data_frame.total_bounds
-            meanx = (minx + maxx) / 2.0
-            meany = (miny + maxy) / 2.0
-            diffx = (maxx - minx) * 1.1
-            diffy = (maxy - miny) * 1.1
-            # print('x ', minx, maxx, diffx)
-            # print('y ', miny, maxy, diffy)
-            if abs(diffx) < 300.0:
-                diffx = 300.0
-            if abs(diffy) < 300.0:
-                diffy = 300.0
-            if diffx < diffy:
-                diffx = diffy
+        if self.has_data:
+            if self.frame_is_stale:
+                self.update_gps_data_frame()
+            x = self.window_x
+            y = self.window_y
+            if self.scatter_artist is None or self.scatter_artist not in axis.collections:
+                # First plot on this axis (or it was cleared), so build the artists.
+                axis.set_axis_off()
+                self.scatter_artist = axis.scatter(x, y, color=self.colors, s=self.sizes,
+                                                   zorder=2)
+                load_contextily().add_attribution(axis, BASEMAP_SOURCE.get('attribution'))
+                self.line_artist = None
+                self.basemap_artist = None
+                self.plot_bounds = None
             else:
-                diffy = diffx
-            minx = meanx - (diffx / 2.0)
-            maxx = meanx + (diffx / 2.0)
-            # miny = miny - (0.1 * diffy)
-            # maxy = maxy + (0.1 * diffy)
-            miny = meany - (diffy / 2.0)
-            maxy = meany + (diffy / 2.0)
-            # print('nx ', minx, maxx, diffx)
-            # print('ny ', miny, maxy, diffy)
-            axis.set_xlim(minx, maxx)
-            axis.set_ylim(miny, maxy)
-            cx.add_basemap(ax=axis, source=cx.providers.OpenStreetMap.Mapnik)
+                self.scatter_artist.set_offsets(np.column_stack([x, y]))
+                self.scatter_artist.set_color(self.colors)
+                self.scatter_artist.set_sizes(self.sizes)
+            # The track is a single polyline under the points.
+            if self.line_artist is None:
+                self.line_artist = axis.plot(x, y, color='black', linewidth=0.2, zorder=1)[0]
+            else:
+                self.line_artist.set_data(x, y)
+            minx, maxx, miny, maxy = self.window_bounds(window_x=x, window_y=y)
+            # Only move the view and fetch a new basemap when it shifts by more than 1%.
+            if self.plot_bounds is None or \
+                    np.abs(np.subtract((minx, maxx, miny, maxy), self.plot_bounds)).max() \
+                    > 0.01 * (maxx - minx):
+                self.plot_bounds = (minx, maxx, miny, maxy)
+                axis.set_xlim(minx, maxx)
+                axis.set_ylim(miny, maxy)
+                if self.basemap_artist is not None:
+                    self.basemap_artist.remove()
+                    self.basemap_artist = None
+                tiles = basemap_tiles(minx, maxx, miny, maxy)
+                future = self.prefetch_futures.get(tiles)
+                if future is not None and not future.cancelled():
+                    # The range is already being prefetched, and lru_cache does not share a
+                    # call that is still running, so wait on that job instead of fetching twice.
+                    image, extent = future.result()
+                else:
+                    image, extent = fetch_basemap(*tiles)
+                self.basemap_artist = axis.imshow(image, extent=extent, interpolation='bilinear',
+                                                  aspect=axis.get_aspect())
+                axis.axis((minx, maxx, miny, maxy))
+                self.prefetch_neighbor_basemaps(tiles=tiles)
+        return
+
+    def prefetch_neighbor_basemaps(self, tiles: tuple):
+        # Build the basemaps for one step forward and back on worker threads, so the next key
+        # press finds its image in the fetch_basemap cache instead of waiting on tiles. tiles is
+        # the range just drawn, which is already cached.
+        if self.prefetch_executor is None:
+            self.prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+        wanted = list()
+        for i in (self.index + self.step_delta_rate, self.index - self.step_delta_rate):
+            if 0 <= i <= self.max_index():
+                minx, maxx, miny, maxy = self.window_bounds(
+                    window_x=self.merc_x[i:i + self.window],
+                    window_y=self.merc_y[i:i + self.window])
+                neighbor = basemap_tiles(minx, maxx, miny, maxy)
+                if neighbor != tiles and neighbor not in wanted:
+                    wanted.append(neighbor)
+        # Keep the jobs that are still wanted and cancel the queued ones the user has stepped
+        # past, so holding an arrow key never piles up fetches. A job that is already running
+        # cannot be cancelled, so it is kept until it finishes for plot_gps to wait on.
+        futures = dict()
+        for neighbor, future in self.prefetch_futures.items():
+            if neighbor in wanted and not future.cancelled():
+                futures[neighbor] = future
+            elif not future.cancel() and not future.done():
+                futures[neighbor] = future
+        for neighbor in wanted:
+            if neighbor not in futures:
+                futures[neighbor] = self.prefetch_executor.submit(fetch_basemap, *neighbor)
+        self.prefetch_futures = futures
+        return
+
+    def stop_prefetch(self):
+        # Drop the queued prefetch jobs without waiting, so closing the window or loading a new
+        # file does not sit behind downloads for the old view.
+        if self.prefetch_executor is not None:
+            self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+            self.prefetch_executor = None
+        self.prefetch_futures = dict()
         return
 
     def load_data_init(self):
-        del self.gps_data
-        self.gps_data = list()
+        self.stop_prefetch()
+        self.latitude = np.empty(0, dtype=np.float64)
+        self.longitude = np.empty(0, dtype=np.float64)
+        self.is_valid = np.empty(0, dtype=bool)
+        self.start_stamp = np.empty(0, dtype=object)
+        self.last_stamp = np.empty(0, dtype=object)
+        self.count = np.empty(0, dtype=np.int64)
+        self.first_index = np.empty(0, dtype=np.int64)
+        self.last_index = np.empty(0, dtype=np.int64)
+        self.merc_x = np.empty(0, dtype=np.float64)
+        self.merc_y = np.empty(0, dtype=np.float64)
         self.has_data = False
         self.data_has_changed = False
         self.index = 0
         self.data_size = 0
-        self.gps_window = 10
+        self.window = 10
         return
 
-    def load_data_end(self):
-        if len(self.gps_data) > 0:
-            self.data_size = len(self.gps_data)
+    def load_data_end(self, latitude: list, longitude: list, stamps: list, is_valid: list,
+                      indices: list):
+        if len(latitude) > 0:
+            lat = np.asarray(latitude, dtype=np.float64)
+            lon = np.asarray(longitude, dtype=np.float64)
+            # A new run starts wherever the position differs from the row before it.
+            starts = np.empty(len(lat), dtype=bool)
+            starts[0] = True
+            np.not_equal(lat[1:], lat[:-1], out=starts[1:])
+            starts[1:] |= lon[1:] != lon[:-1]
+            first = np.flatnonzero(starts)
+            last = np.append(first[1:] - 1, len(lat) - 1)
+
+            self.data_size = len(first)
+            # Keep each run field as a contiguous array so a window is a slice.
+            self.latitude = lat[first]
+            self.longitude = lon[first]
+            self.is_valid = np.asarray(is_valid, dtype=bool)[first]
+            rows = np.asarray(indices, dtype=np.int64)
+            self.first_index = rows[first]
+            self.last_index = rows[last]
+            self.count = last - first + 1
+            stamps = np.asarray(stamps, dtype=object)
+            self.start_stamp = stamps[first]
+            self.last_stamp = stamps[last]
+            # Project the whole track to web mercator once instead of on every window change.
+            self.merc_x, self.merc_y = web_mercator_transformer().transform(self.longitude,
+                                                                            self.latitude)
             self.has_data = True
             self.data_has_changed = False
             self.apply_window_variable_logic()
             self.update_gps_data_frame()
+            if self.warm_tiles:
+                thread = threading.Thread(target=self.warm_tile_cache)
+                thread.daemon = True
+                thread.start()
         else:
             self.load_data_init()
         return
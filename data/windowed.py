@@ -0,0 +1,90 @@
+# *****************************************************************************#
+# **
+# **  Smart Watch Visualizer
+# **
+# **    Brian L. Thomas, 2023
+# **
+# ** Tools by the Center for Advanced Studies in Adaptive Systems at the
+# **  School of Electrical Engineering and Computer Science at
+# **  Washington State University
+# **
+# ** Copyright Brian L. Thomas, 2023
+# **
+# ** All rights reserved
+# ** Modification, distribution, and sale of this work is prohibited without
+# **  permission from Washington State University
+# **
+# ** Contact: Brian L. Thomas (bthomas1@wsu.edu)
+# *****************************************************************************#
+
+
+class WindowedData:
+    """
+    The index and window logic shared by the GPS and sensor data, which both show a window of
+    `window` entries starting at `index` out of `data_size` entries.
+    """
+    def __init__(self, window: int, window_size_adj_rate: int, step_delta_rate: int):
+        self.has_data = False
+        self.data_has_changed = False
+        self.index = 0
+        self.data_size = 0
+        self.window = window
+        self.window_size_adj_rate = window_size_adj_rate
+        self.step_delta_rate = step_delta_rate
+        return
+
+    def apply_window_variable_logic(self):
+        if self.has_data:
+            if self.data_size < self.window:
+                self.window = self.data_size
+            if self.data_size < self.window_size_adj_rate:
+                self.window_size_adj_rate = int(self.data_size / 2)
+            if self.data_size < self.step_delta_rate:
+                self.step_delta_rate = int(self.data_size / 2)
+        return
+
+    def max_index(self) -> int:
+        return self.data_size - self.window
+
+    def window_changed(self):
+        # Called after the index or window size moves, subclasses refresh anything built from it.
+        return
+
+    def increase_window_size(self) -> bool:
+        action = False
+        if (self.index + self.window + self.window_size_adj_rate) <= self.data_size:
+            self.window += self.window_size_adj_rate
+            self.window_changed()
+            action = True
+        return action
+
+    def decrease_window_size(self) -> bool:
+        action = False
+        if (self.window - self.window_size_adj_rate) >= 1:
+            self.window -= self.window_size_adj_rate
+            self.window_changed()
+            action = True
+        return action
+
+    def step_forward(self) -> bool:
+        action = False
+        if (self.index + self.window + self.step_delta_rate) <= self.data_size:
+            self.index += self.step_delta_rate
+            self.window_changed()
+            action = True
+        return action
+
+    def step_backward(self) -> bool:
+        action = False
+        if (self.index - self.step_delta_rate) >= 0:
+            self.index -= self.step_delta_rate
+            self.window_changed()
+            action = True
+        return action
+
+    def goto_index(self, clicked_float: float):
+        # Clamp clicks just past either end of the bar instead of ignoring them.
+        clicked_float = min(max(clicked_float, 0.0), 1.0)
+        self.index = max(int(clicked_float * self.max_index()), 0)
+        self.window_changed()
+        return
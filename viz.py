@@ -434,7 +434,15 @@ class SmartWatchVisualizer:
             self.draw_canvas_next()
         return
 
+    def queue_draw_canvas(self):
+        # Only keep one redraw waiting so holding a key does not stack up draws.
+        if not self.draw_pending:
+            self.draw_pending = True
+            GLib.idle_add(self.draw_canvas)
+        return
+
     def draw_canvas_next(self):
+        self.draw_pending = False
         if self.STATE == MODE_ANNOTATION_HELP:
             i = self.data_windows.list[self.data_windows.index].i_start
             self.progress.set_fraction(float(i)/float(self.data.data_size()))
@@ -475,7 +483,7 @@ class SmartWatchVisualizer:
                 self.progress.set_fraction(float(self.data.index())/float(self.data.data_size()))
             if self.mode_gps_item.get_active():
                 # The STATE is MODE_GPS_VISUALIZATION
-                self.ax.cla()
+                # The axis is not cleared here, plot_gps updates its own artists in place.
                 self.data.plot_gps(self.ax)
                 self.ax.set_axis_off()
                 # self.canvas.draw()
@@ -497,10 +505,8 @@ class SmartWatchVisualizer:
                     self.canvas.draw_idle()
                     self.canvas.flush_events()
                 # print('draw for sensors')
+                # Only the label axis is cleared, plot_sensors moves the sensor lines in place.
                 self.axes1.cla()
-                self.axes2.cla()
-                self.axes3.cla()
-                self.axes4.cla()
                 self.data.plot_sensors(axis1=self.axes1,
                                        axis2=self.axes2,
                                        axis3=self.axes3,
@@ -566,7 +572,7 @@ class SmartWatchVisualizer:
                     self.need_redraw = True
                     self.update_last_key_presses()
                 else:
-                    GLib.idle_add(self.draw_canvas)
+                    self.queue_draw_canvas()
         elif event.keyval == 65363:     # Right
             # print('RIGHT')
             if self.STATE == MODE_ANNOTATION_HELP:
@@ -580,7 +586,7 @@ class SmartWatchVisualizer:
                     self.need_redraw = True
                     self.update_last_key_presses()
                 else:
-                    GLib.idle_add(self.draw_canvas)
+                    self.queue_draw_canvas()
         elif event.keyval == 65362:     # Up
             # print('UP')
             if self.data.increase_window_size():
@@ -590,7 +596,7 @@ class SmartWatchVisualizer:
                     self.need_redraw = True
                     self.update_last_key_presses()
                 else:
-                    GLib.idle_add(self.draw_canvas)
+                    self.queue_draw_canvas()
         elif event.keyval == 65364:     # Down
             # print('DOWN')
             if self.data.decrease_window_size():
@@ -600,7 +606,7 @@ class SmartWatchVisualizer:
                     self.need_redraw = True
                     self.update_last_key_presses()
                 else:
-                    GLib.idle_add(self.draw_canvas)
+                    self.queue_draw_canvas()
         elif self.STATE == MODE_GPS_VISUALIZATION:
             if event.string == self.config.gps_invalid:
                 # print(self.config.gps_invalid)
@@ -980,6 +986,7 @@ class SmartWatchVisualizer:
 
     def close_application(self, *args):
         self.config.save_config()
+        self.data.close()
         Gtk.main_quit()
         return
 
@@ -998,9 +1005,12 @@ class SmartWatchVisualizer:
         self.STATE = MODE_FIRST_WINDOW
         self.data = WatchData()
         self.data.full_data.color_map = list(COLORS)
+        # Hand the settings to the data before the first load, it reads warm_tile_cache there.
+        self.data.update_config(wconfig=self.config)
         self.opened_filename = None
         self.need_redraw = False
         self.had_extra_redraw = False
+        self.draw_pending = False
         self.timer = None
         self.gps_timer = None
         self.data_windows = DataWindowList()